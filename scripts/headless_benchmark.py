@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from vmd import molecule as mol
+from vmdviz.tools import *
+
+# Script for measuring the per-frame time saved by headless rendering.
+# The same trajectory movie is rendered with and without interactive
+# display redraws. A warm-up pass is discarded, and the two modes are
+# then alternated (swapping which goes first on every repeat) so that
+# caching and warm-up effects do not favour either mode.
+
+parser = argparse.ArgumentParser(description='benchmark per-frame rendering '
+                                 'time with and without headless mode',
+                                 formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument("pdbfile", help="PDB file to provide structure/topolgy")
+parser.add_argument("simfile", help="trajectory file")
+parser.add_argument("--simtype", help="trajectory type/file extension",
+                    default='xtc')
+parser.add_argument("--stride", help="frame stride for loading trajectory",
+                    default=10, type=int)
+parser.add_argument("--frames", help="number of frames rendered per run",
+                    default=100, type=int)
+parser.add_argument("--repeats", help="number of timed runs per mode",
+                    default=5, type=int)
+parser.add_argument("--renderer", help="VMD renderer", default='Tachyon')
+parser.add_argument("--render_ext", help="rendered file extension",
+                    default='dat')
+options = parser.parse_args()
+
+load_data = {'filetype' : options.simtype,
+             'filename' : options.simfile,
+             'stride' : options.stride,
+             'waitfor' : -1}
+style = [{'style' : 'VDW 1.0 12', 'color' : 'index',
+          'selection' : 'all', 'material' : 'Diffuse'}]
+model = VMDMolecule(options.pdbfile, load_data=load_data, style=style,
+                    flush_pdb_frame=True, align=False)
+num_frames = min(options.frames, mol.numframes(model.molid))
+print("{} atoms, {} frames per run, {} runs per mode".format(
+      mol.numatoms(model.molid), num_frames, options.repeats))
+
+
+def time_run(headless):
+    """Renders num_frames frames and returns the mean time per frame"""
+    save_dir = tempfile.mkdtemp()
+    start = time.perf_counter()
+    generate_trajectory_movie(model, 'bench', save_dir=save_dir,
+                              start=0, stop=num_frames,
+                              renderer=options.renderer,
+                              render_ext=options.render_ext,
+                              headless=headless)
+    elapsed = (time.perf_counter() - start) / num_frames
+    shutil.rmtree(save_dir)
+    return elapsed
+
+
+# warm-up pass, not timed
+time_run(False)
+
+timings = {False : [], True : []}
+for repeat in range(options.repeats):
+    order = [False, True] if repeat % 2 == 0 else [True, False]
+    for headless in order:
+        timings[headless].append(time_run(headless))
+
+for headless, name in [(False, 'interactive'), (True, 'headless')]:
+    runs = np.array(timings[headless])
+    print("{:<12}: {:.4f} +/- {:.4f} s/frame (min {:.4f}, max {:.4f})"
+          .format(name, runs.mean(), runs.std(), runs.min(), runs.max()))
+saved = np.array(timings[False]) - np.array(timings[True])
+print("{:<12}: {:.4f} +/- {:.4f} s/frame ({:.1f}%)".format(
+      'saved', saved.mean(), saved.std(),
+      100 * saved.mean() / np.mean(timings[False])))
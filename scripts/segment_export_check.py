@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import cv2
+import numpy as np
+from vmdviz.tools import *
+
+# Script for checking that a segment-parallel export is frame-identical
+# to a sequential export of the same movies. Both exports are decoded
+# and compared frame by frame, and any differing frames are reported.
+# Use inputs of different lengths and --titles to check that movies
+# which have ended are composited the same way in every segment.
+
+parser = argparse.ArgumentParser(description='compare segment-parallel and '
+                                 'sequential Dashboard exports frame by frame',
+                                 formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument("files", nargs="+", help="input movie files")
+parser.add_argument("--segments", help="number of export segments",
+                    default=3, type=int)
+parser.add_argument("--titles", nargs="+", help="optional titles for the "
+                    "input movies, drawn as labels", default=None)
+parser.add_argument("--panels", nargs="+", help="optional NumPy/CSV time "
+                    "series files plotted next to the movies", default=None)
+
+
+def read_all(filename):
+    """Decodes every frame of a movie file"""
+    movie = cv2.VideoCapture(filename)
+    frames = []
+    while True:
+        status, frame = movie.read()
+        if not status:
+            break
+        frames.append(frame)
+    movie.release()
+    return frames
+
+
+def export(options, filename, segments):
+    """Exports the input movies to filename"""
+    panels = None
+    if options.panels:
+        panels = [AnalysisPanel(series_file) for series_file in options.panels]
+    dash = Dashboard(options.files, labels=options.titles, panels=panels)
+    dash.write_movie(filename, segments=segments)
+
+
+if __name__ == '__main__':
+    options = parser.parse_args()
+    out_dir = tempfile.mkdtemp()
+    try:
+        sequential_file = os.path.join(out_dir, 'sequential.avi')
+        segmented_file = os.path.join(out_dir, 'segmented.avi')
+        export(options, sequential_file, 1)
+        export(options, segmented_file, options.segments)
+        sequential = read_all(sequential_file)
+        segmented = read_all(segmented_file)
+    finally:
+        shutil.rmtree(out_dir)
+
+    failures = 0
+    if len(sequential) != len(segmented):
+        print("frame count differs: {} sequential, {} segmented"
+              .format(len(sequential), len(segmented)))
+        failures += 1
+    for idx, (a, b) in enumerate(zip(sequential, segmented)):
+        diff = cv2.absdiff(a, b)
+        if diff.any():
+            print("frame {}: max abs diff {}, {} differing pixels"
+                  .format(idx, diff.max(), np.count_nonzero(diff.any(axis=2))))
+            failures += 1
+    if failures:
+        sys.exit(1)
+    print("{} frames identical.".format(len(sequential)))
@@ -19,14 +19,45 @@ def main():
 
 
     if options.titles:
-        if len(options.titles) != len(options.files):
+        if len(options.titles) != len(options.files) + len(options.live or []):
             raise RuntimeError("If --titles is specified, it must "
-                               "be the same length as --files")
+                               "be the same length as --files (and --live)")
 
-    dash = Dashboard(options.files, labels=options.titles)
+    if options.panels and options.paneltitles:
+        if len(options.paneltitles) != len(options.panels):
+            raise RuntimeError("If --paneltitles is specified, it must "
+                               "be the same length as --panels")
+    panels = None
+    if options.panels:
+        titles = options.paneltitles or [None for _ in options.panels]
+        panels = [AnalysisPanel(series_file, label=title)
+                  for series_file, title in zip(options.panels, titles)]
+
+    cache = None
+    if options.cachedir != None:
+        cache = FrameCache(options.cachedir, max_size=options.cachesize,
+                           scale=options.cachescale)
+
+    movies = list(options.files)
+    if options.live:
+        # live frames are tiled against the reference movies, which are
+        # downscaled when loaded through the frame cache
+        reference = cv2.VideoCapture(options.files[0])
+        size = scaled_size(reference.get(cv2.CAP_PROP_FRAME_WIDTH),
+                           reference.get(cv2.CAP_PROP_FRAME_HEIGHT),
+                           cache.scale if cache else 1.0)
+        reference.release()
+        for prefix in options.live:
+            movies.append(LiveMovie(os.path.dirname(prefix) or '.',
+                                    os.path.basename(prefix),
+                                    render_ext=options.liveext, size=size))
+
+    dash = Dashboard(movies, labels=options.titles, cache=cache,
+                     panels=panels)
 
     if options.outfile != None:
-        dash.write_movie(options.outfile, fourcc=options.fourcc)
+        dash.write_movie(options.outfile, fourcc=options.fourcc,
+                        segments=options.segments)
     else:
         dash.play_movies()
 
@@ -43,6 +74,31 @@ def argparser(args):
                         "videos, following the same order as --files", default=None)
     parser.add_argument("--fourcc", help='FOURCC code for video writing.',
                         default='MJPG')
+    parser.add_argument("--live", nargs="+", help="optional renders in progress, "
+                        "given as save directory and the full movie basename, ie the "
+                        "manifest name without '.frames' (eg, "
+                        "movies/my_sim_traj_stride_10_step_1_smoothing_0), tiled "
+                        "after --files and updated as frames are rendered",
+                        default=None)
+    parser.add_argument("--liveext", help='file extension of frames rendered by '
+                        '--live jobs', default='bmp')
+    parser.add_argument("--segments", help='number of segments exported in '
+                        'parallel worker processes when writing to file '
+                        '(MJPG only)',
+                        default=1, type=int)
+    parser.add_argument("--panels", nargs="+", help="optional NumPy/CSV time "
+                        "series files, aligned to frame indices, plotted next to "
+                        "the movies", default=None)
+    parser.add_argument("--paneltitles", nargs="+", help="optional y-axis labels "
+                        "for the analysis panels, following the same order as "
+                        "--panels", default=None)
+    parser.add_argument("--cachedir", help='directory for caching decoded frames '
+                        'between sessions. If not specified, frames are not cached.',
+                        default=None)
+    parser.add_argument("--cachesize", help='maximum size (MB) of the frame cache',
+                        default=4096, type=float)
+    parser.add_argument("--cachescale", help='factor by which cached frames are '
+                        'downscaled', default=1.0, type=float)
 
     return parser.parse_args(args), parser
 
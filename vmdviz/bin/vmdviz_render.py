@@ -3,6 +3,10 @@ import sys
 import argparse
 import json
 
+# Stride used when the trajectory filetype does not support automatic
+# stride planning
+DEFAULT_STRIDE = 100
+
 def main():
     """simple script for producing rotation movies of the
     first and final configurations of a CACB trajectory, as
@@ -13,18 +17,50 @@ def main():
     options = argparser(args)
     print(options)
 
-    # Data payload
-    load_data = {'filetype' : options.simtype,
-                 'filename' : options.simfile,
-                 'stride' : options.stride,
-                 'waitfor' : -1}
-
     runtime_config = load_rc(options.rcfile, )
     render_options = runtime_config['rendering']
+    # validate rendering options before any coordinates are loaded
+    if options.publish and render_options['renderer'] not in IMAGE_RENDERERS:
+        raise RuntimeError("--publish requires a renderer that writes images, "
+                           "one of: {}".format(IMAGE_RENDERERS))
+    if options.encoder and render_options['renderer'] not in IMAGE_RENDERERS:
+        raise RuntimeError("--encoder requires a renderer that writes images, "
+                           "one of: {}".format(IMAGE_RENDERERS))
+    if options.encoder and options.publish:
+        raise RuntimeError("--publish cannot be combined with --encoder, as "
+                           "individual images are not kept.")
+
+    # Data payload
+    if options.stride is None and options.simtype not in TRAJECTORY_READERS:
+        print("Warning: cannot plan the stride automatically for filetype "
+              "'{}'. Using the fixed stride of {}.".format(options.simtype,
+                                                          DEFAULT_STRIDE))
+        options.stride = DEFAULT_STRIDE
+
+    if options.stride is None:
+        plan = plan_render(options.pdbfile, options.simfile,
+                           filetype=options.simtype,
+                           mem_budget=options.membudget,
+                           target_frames=options.movieframes,
+                           max_stride=options.maxstride,
+                           drop_solvent=not options.keepsolvent,
+                           solvent_fraction=options.solventfraction)
+        load_data = plan['load_data']
+        options.stride = plan['stride']
+        if plan['selection']:
+            for rep in runtime_config['styles']:
+                rep['selection'] = "({}) and ({})".format(
+                    rep.get('selection', 'all'), plan['selection'])
+    else:
+        load_data = {'filetype' : options.simtype,
+                     'filename' : options.simfile,
+                     'stride' : options.stride,
+                     'waitfor' : -1}
 
     # VDMmolecule creation
     model = VMDMolecule(options.pdbfile, style=runtime_config['styles'],
-                        load_data=load_data, flush_pdb_frame=True)
+                        load_data=load_data, flush_pdb_frame=True,
+                        headless=options.headless)
 
     # CA backbone bonds
     CA_selection = atomsel('name CA').index
@@ -44,28 +80,67 @@ def main():
 
     init_display(runtime_config['display'], runtime_config['axes'])
 
+    store = None
+    if options.storedir != None:
+        store = RenderStore(options.storedir, max_size=options.storesize)
+
     init_rotate_filename = options.basename + "_init_rotate_step_{}".format(options.anglestep)
     final_rotate_filename = options.basename + "_final_rotate_step_{}".format(options.anglestep)
     traj_filename = options.basename + "_traj_stride_{}".format(options.stride) + "_step_{}".format(options.trajstep) + "_smoothing_{}".format(options.smoothing)
 
-    generate_rotation_movie(model, init_rotate_filename, frame=0,
-                            save_dir=options.savedir,
-                            division=options.anglestep,
-                            renderer=render_options['renderer'],
-                            render_ext=render_options['render_extension'])
+    for name, frame in [(init_rotate_filename, 0), (final_rotate_filename, -1)]:
+        encoder = movie_encoder(options, name)
+        try:
+            generate_rotation_movie(model, name, frame=frame,
+                                    save_dir=options.savedir,
+                                    division=options.anglestep,
+                                    renderer=render_options['renderer'],
+                                    render_ext=render_options['render_extension'],
+                                    headless=options.headless, store=store,
+                                    publish=options.publish, encoder=encoder)
+        finally:
+            if encoder:
+                encoder.close()
+
+    encoder = movie_encoder(options, traj_filename)
+    try:
+        generate_trajectory_movie(model, traj_filename,
+                                  save_dir=options.savedir,
+                                  start=0, stop=-1, step=options.trajstep,
+                                  smoothing=options.smoothing,
+                                  renderer=render_options['renderer'],
+                                  render_ext=render_options['render_extension'],
+                                  headless=options.headless, store=store,
+                                  publish=options.publish, encoder=encoder)
+    finally:
+        if encoder:
+            encoder.close()
+
+
+def movie_encoder(options, name):
+    """Helper function to create a movie encoder for direct encoding of
+    rendered images, if requested on the command line.
 
-    generate_rotation_movie(model, final_rotate_filename, frame=-1,
-                            save_dir=options.savedir,
-                            division=options.anglestep,
-                            renderer=render_options['renderer'],
-                            render_ext=render_options['render_extension'])
+    Parameters
+    ----------
+    options : argparse.Namespace
+        Parsed command line options.
+    name : str
+        Basename of the movie file.
+
+    Returns
+    -------
+    encoder : MovieEncoder or None
+        Encoder writing to options.savedir, or None if --encoder was
+        not specified.
+    """
 
-    generate_trajectory_movie(model, traj_filename,
-                              save_dir=options.savedir,
-                              start=0, stop=-1, step=options.trajstep,
-                              smoothing=options.smoothing,
-                              renderer=render_options['renderer'],
-                              render_ext=render_options['render_extension'])
+    if options.encoder == None:
+        return None
+    ext = 'avi' if options.encoder == 'opencv' else 'mp4'
+    return MovieEncoder(os.path.join(options.savedir, name + '.' + ext),
+                        fps=options.fps, backend=options.encoder,
+                        fourcc=options.fourcc)
 
 
 def load_rc(rc_file):
@@ -102,8 +177,28 @@ def argparser(args):
                         default='xtc')
     parser.add_argument("--savedir", help="directory in which to save movies",
                         default='.')
-    parser.add_argument("--stride", help="frame stride for loading trajectory",
-                        default=100, type=int)
+    parser.add_argument("--stride", help="frame stride for loading trajectory. "
+                        "If not specified, the stride is chosen automatically "
+                        "from --membudget and --movieframes for xtc and dcd "
+                        "trajectories, and is {} otherwise".format(DEFAULT_STRIDE),
+                        default=None, type=int)
+    parser.add_argument("--membudget", help="memory budget (MB) for loaded "
+                        "trajectory frames when choosing the stride automatically",
+                        default=2048, type=float)
+    parser.add_argument("--movieframes", help="target number of loaded frames "
+                        "when choosing the stride automatically",
+                        default=1000, type=int)
+    parser.add_argument("--maxstride", help="largest stride allowed when choosing "
+                        "the stride automatically. If exceeded, a shorter window "
+                        "of the trajectory is loaded instead", default=None, type=int)
+    parser.add_argument("--keepsolvent", help="keep solvent/ions in the molecule "
+                        "representations when choosing the stride automatically. "
+                        "Otherwise they are dropped from the representations of "
+                        "mostly solvent systems (they are loaded either way)",
+                        action='store_true')
+    parser.add_argument("--solventfraction", help="fraction of solvent atoms above "
+                        "which solvent is dropped from the representations when "
+                        "choosing the stride automatically", default=0.5, type=float)
     parser.add_argument("--basename", help="base file name for final movie files",
                         default='my_sim')
     parser.add_argument("--trajstep", help="frame step size for trajecotry movie rendering",
@@ -114,6 +209,27 @@ def argparser(args):
                         default=0, type=int)
     parser.add_argument("--rcfile", help="runtime configuration file that defines style "
                         "and rendering options", default=HOME + '/.vmdvizrc.json')
+    parser.add_argument("--headless", help="suppress interactive display redraws "
+                        "for offscreen rendering", action='store_true')
+    parser.add_argument("--storedir", help="directory of a content-addressed store "
+                        "used to reuse identical rendered frames. If not specified, "
+                        "every frame is rendered", default=None)
+    parser.add_argument("--storesize", help="maximum size (MB) of the rendered "
+                        "frame store", default=4096, type=float)
+    parser.add_argument("--publish", help="publish finished frames to a manifest in "
+                        "--savedir for live preview with movie_combine --live. "
+                        "Requires a renderer that writes images (eg, TachyonInternal "
+                        "or snapshot)",
+                        action='store_true')
+    parser.add_argument("--encoder", help="encode rendered images directly into a "
+                        "movie in --savedir instead of keeping individual files. "
+                        "Requires a renderer that writes images (eg, TachyonInternal "
+                        "or snapshot) and an OpenCV-readable render extension "
+                        "(eg, bmp)", choices=['opencv', 'ffmpeg'], default=None)
+    parser.add_argument("--fps", help="frame rate of directly encoded movies",
+                        default=30, type=float)
+    parser.add_argument("--fourcc", help="FOURCC code for directly encoded movies "
+                        "with the opencv encoder", default='MJPG')
     return parser.parse_args(args)
 
 
@@ -1,2 +1,9 @@
 from .molrender import *
 from .dashboard import *
+from .sources import *
+from .diskcache import *
+from .framecache import *
+from .planner import *
+from .renderstore import *
+from .live import *
+from .encoder import *
@@ -1,6 +1,256 @@
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 import cv2
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+
+def load_series(series_file, column=-1, frame_column=None):
+    """Helper function to load a time series aligned to movie frame
+    indices from a NumPy (.npy) or CSV file.
+
+    Parameters
+    ----------
+    series_file : str
+        NumPy or comma-separated file containing the series. Lines in
+        CSV files starting with '#' are ignored.
+    column : int (default=-1)
+        Column of a two dimensional file containing the series values.
+    frame_column : int (default=None)
+        Column of a two dimensional file containing the frame index of
+        each value. If None, the nth value corresponds to frame n.
+
+    Returns
+    -------
+    frames : np.ndarray
+        Frame index of each value.
+    values : np.ndarray
+        Series values.
+    """
+    if series_file.endswith('.npy'):
+        data = np.load(series_file)
+    else:
+        data = np.loadtxt(series_file, delimiter=',', comments='#')
+    if data.ndim == 1:
+        if frame_column is not None:
+            raise ValueError("frame_column requires a two dimensional "
+                             "series file.")
+        values = data
+    else:
+        values = data[:, column]
+    if frame_column is None:
+        frames = np.arange(len(values))
+    else:
+        frames = data[:, frame_column]
+    return frames, values
+
+
+class AnalysisPanel():
+    """Class for displaying a time series (eg, RMSD, radius of gyration,
+    energy) alongside movies in a Dashboard, synced to the playhead. The
+    matplotlib plot is rendered once into a cached background image, and
+    each frame only draws a cursor and marker into a copy of that image.
+
+    Parameters
+    ----------
+    series_file : str
+        NumPy or CSV file containing the series. See load_series().
+    label : str (default=None)
+        Label of the y-axis. If None, the series filename is used.
+    column : int (default=-1)
+        Column of the series file containing the values.
+    frame_column : int (default=None)
+        Column of the series file containing the frame indices.
+    aspect : float (default=1.333)
+        Width to height ratio of the panel.
+    color : tuple of int (default=(0, 0, 255))
+        BGR color of the cursor and marker.
+    """
+
+    def __init__(self, series_file, label=None, column=-1, frame_column=None,
+                 aspect=1.333, color=(0, 0, 255)):
+        self.frames, self.values = load_series(series_file, column=column,
+                                               frame_column=frame_column)
+        self.label = label if label is not None else series_file
+        self.aspect = aspect
+        self.color = np.array(color, dtype=np.uint8)
+        self.background = None
+
+
+    def render_background(self, height):
+        """Method that renders the static plot once and caches it as a
+        BGR image, along with the pixel coordinates of every point in the
+        series.
+
+        Parameters
+        ----------
+        height : int
+            Height in pixels of the panel, which must match the height
+            of the movie frames.
+        """
+        dpi = 100
+        width = int(height * self.aspect)
+        fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        ax.plot(self.frames, self.values, color='k', linewidth=1)
+        ax.set_xlabel('frame')
+        ax.set_ylabel(self.label)
+        ax.set_xlim(self.frames[0], self.frames[-1])
+        fig.tight_layout()
+        canvas.draw()
+
+        rgba = np.asarray(canvas.buffer_rgba())
+        canvas_height, canvas_width = rgba.shape[:2]
+        background = cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+        # the canvas may be off by a pixel due to rounding, but hconcat
+        # requires the panel height to match the movies exactly
+        self.background = cv2.resize(background, (canvas_width, height))
+        self.tile = self.background.copy()
+        y_scale = height / canvas_height
+
+        # matplotlib display coordinates originate at the bottom left
+        points = ax.transData.transform(np.column_stack([self.frames,
+                                                         self.values]))
+        self.x_pixels = np.clip(np.rint(points[:, 0]).astype(int),
+                                0, canvas_width - 1)
+        self.y_pixels = np.clip(np.rint((canvas_height - points[:, 1])
+                                        * y_scale).astype(int), 0, height - 1)
+        bbox = ax.get_window_extent()
+        self.y_range = (int((canvas_height - bbox.y1) * y_scale),
+                        int((canvas_height - bbox.y0) * y_scale))
+
+
+    def draw(self, frame_idx):
+        """Method that draws the cursor and marker for a frame index onto
+        the cached background.
+
+        Parameters
+        ----------
+        frame_idx : int
+            Current movie frame index.
+
+        Returns
+        -------
+        tile : np.ndarray
+            BGR image of the panel.
+        """
+        point = min(np.searchsorted(self.frames, frame_idx),
+                    len(self.frames) - 1)
+        x, y = self.x_pixels[point], self.y_pixels[point]
+        np.copyto(self.tile, self.background)
+        self.tile[self.y_range[0]:self.y_range[1], max(x - 1, 0):x + 1] = self.color
+        self.tile[max(y - 3, 0):y + 4, max(x - 3, 0):x + 4] = self.color
+        return self.tile
+
+
+def open_writer(filename, fourcc, frame_size, fps=30):
+    """Helper function to open a cv2.VideoWriter. MJPG movies are written
+    with OpenCV's built-in MJPEG encoder, which compresses every frame
+    with the same fixed quality, so that a frame is encoded identically
+    regardless of the frames written before it. Other FOURCC codes are
+    left to the default backend.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file to which the movie will be written.
+    fourcc : str
+        FOURCC video format code.
+    frame_size : tuple of int
+        (width, height) of the movie frames.
+    fps : float (default=30)
+        Frame rate of the movie.
+
+    Returns
+    -------
+    writer : cv2.VideoWriter
+        The opened writer.
+    """
+    backend = cv2.CAP_OPENCV_MJPEG if fourcc == 'MJPG' else cv2.CAP_ANY
+    writer = cv2.VideoWriter(filename, backend,
+                             fourcc=cv2.VideoWriter_fourcc(*fourcc),
+                             fps=fps, frameSize=frame_size)
+    if not writer.isOpened():
+        raise RuntimeError("VideoWriter could not be opened.")
+    return writer
+
+
+def export_segment(dashboard_options, segment, start, stop, filename,
+                   fourcc='MJPG', report=100):
+    """Function for writing a segment of a combined movie to file. Each
+    input movie is seeked to the segment start, so that segments can be
+    exported independently by separate worker processes.
+
+    Parameters
+    ----------
+    dashboard_options : dict
+        Keyword arguments used to construct the Dashboard in the worker.
+    segment : int
+        Segment number, used for progress reports.
+    start : int
+        First global frame index of the segment.
+    stop : int
+        Global frame index at which the segment ends (exclusive).
+    filename : str
+        Name of the file to which the segment will be written.
+    fourcc : str (default='MJPG')
+        FOURCC video format code used by the cv2.VideoWriter.
+    report : int (default=100)
+        Number of frames between progress reports.
+
+    Returns
+    -------
+    segment : int
+        Segment number.
+    num_frames : int
+        Number of frames written.
+    elapsed : float
+        Wall time in seconds spent on the segment.
+    """
+    begin = time.perf_counter()
+    dash = Dashboard(**dashboard_options)
+    writer = open_writer(filename, fourcc, dash.window_size)
+
+    # Movies shorter than the segment start remain at their final
+    # read frame, as in a sequential export. composite_frames() labels
+    # copies of the frames, so the held frame is composited the same
+    # way no matter how often it was shown before the segment start.
+    for num, (movie, num_frames) in enumerate(zip(dash.movie_list,
+                                                  dash.num_frames)):
+        last_idx = int(num_frames) - 2
+        if start > last_idx:
+            movie.set(cv2.CAP_PROP_POS_FRAMES, last_idx)
+            status, frame = movie.read()
+            if status:
+                dash.frames[num] = frame
+            dash.current_indices[num] = last_idx + 1
+        else:
+            movie.set(cv2.CAP_PROP_POS_FRAMES, start)
+            dash.current_indices[num] = start
+
+    for num_written, frame_idx in enumerate(range(start, stop)):
+        dash.read_frames()
+        writer.write(dash.composite_frames())
+        if (num_written + 1) % report == 0:
+            print("segment {}: {}/{} frames".format(segment, num_written + 1,
+                                                    stop - start))
+    writer.release()
+    dash.release_movies()
+
+    elapsed = time.perf_counter() - begin
+    print("segment {}: frames {}-{} written in {:.1f} s ({:.1f} frames/s)"
+          .format(segment, start, stop - 1, elapsed,
+                  (stop - start) / elapsed))
+    return segment, stop - start, elapsed
+
 
 class Dashboard():
     """Class for organizing and displaying movies in a single window
@@ -8,15 +258,25 @@ class Dashboard():
     Parameters
     ----------
     movie_list : list of movie files
-        List of movie files. THe order of the list detemines the order
-        of the movies in the display window
+        List of movie files or movie sources (eg, LiveMovie). THe order
+        of the list detemines the order of the movies in the display window
     labels : list of str (default=None)
         List of string labels for each movie in the display frame,
         running in the same order as movie_list
+    cache : FrameCache (default=None)
+        If not None, movies are loaded through this frame cache, so
+        that decoded frames are read from memory-mapped files instead
+        of being decoded again in later sessions.
+    panels : list of AnalysisPanel (default=None)
+        Analysis panels displayed to the right of the movies, synced
+        to the current frame index.
     """
 
-    def __init__(self, movie_files, labels=None):
+    def __init__(self, movie_files, labels=None, cache=None, panels=None):
         self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self.movie_files = movie_files
+        self.cache = cache
+        self.panels = panels if panels is not None else []
         self.movie_list = [self.load_movie(name) for name in movie_files]
         self.current_indices = [0 for _ in self.movie_list]
         self.num_frames = [movie.get(cv2.CAP_PROP_FRAME_COUNT)
@@ -34,18 +294,27 @@ class Dashboard():
 
         Parameters
         ----------
-        movie_file : str
-            Filename from which a movie is loaded.
+        movie_file : str or movie source
+            Filename from which a movie is loaded. Objects that already
+            provide the cv2.VideoCapture interface, such as LiveMovie,
+            are used as they are.
         """
+        if not isinstance(movie_file, str):
+            return movie_file
+        if self.cache is not None:
+            return self.cache.load(movie_file)
         return cv2.VideoCapture(movie_file)
 
 
     def reset_movies(self):
         """Method that resets all movies in self.movie_list
-        to their zeroth frames
+        to their zeroth frames. Frame counts are refreshed, so that
+        sources that grow during playback (eg, LiveMovie) show their
+        newest frames on every loop.
         """
         for num, movie in enumerate(self.movie_list):
             self.current_indices[num] = 0
+            self.num_frames[num] = movie.get(cv2.CAP_PROP_FRAME_COUNT)
             movie.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
 
@@ -109,13 +378,37 @@ class Dashboard():
                 self.frames[num] = frame
             else:
                 statuses[num] = False
-        final = cv2.hconcat(self.frames)
+        for panel in self.panels:
+            panel.render_background(self.frames[0].shape[0])
+        final = cv2.hconcat(self.frames + [panel.background
+                                           for panel in self.panels])
 
         # Due to openCV framesize conventions, the x-y dimensions
         # must be swapped
         self.window_size = (final.shape[:-1][1], final.shape[:-1][0])
 
 
+    def composite_frames(self):
+        """Method for combining the current frames of each movie in
+        self.movie_list, along with any analysis panels, into a single
+        labeled frame.
+
+        Returns
+        -------
+        final : np.ndarray
+            The combined frame.
+        """
+        # labels are drawn on copies, as the frame of a finished movie
+        # is composited again for every remaining output frame
+        tiles = [frame.copy() for frame in self.frames]
+        for text, tile in zip(self.labels, tiles):
+            cv2.putText(tile, text, (100,50), self.font,
+                        1, (255, 255, 255), 1)
+        frame_idx = max(self.current_indices) - 1
+        return cv2.hconcat(tiles + [panel.draw(frame_idx)
+                                    for panel in self.panels])
+
+
     def display_frames(self, writer=None):
         """Method for displaying individual frames for each movie in
         self.movie_list within a single window
@@ -126,10 +419,7 @@ class Dashboard():
             If not none, this video writer will be used to write the
             movie to file.
         """
-        for text, frame in zip(self.labels, self.frames):
-            cv2.putText(frame, text, (100,50), self.font,
-                        1, (255, 255, 255), 1)
-        final = cv2.hconcat(self.frames)
+        final = self.composite_frames()
         cv2.imshow('Frame', final)
         if writer:
             writer.write(final)
@@ -199,7 +489,7 @@ class Dashboard():
                 continue
 
 
-    def write_movie(self, filename, fourcc='MJPG'):
+    def write_movie(self, filename, fourcc='MJPG', segments=1):
         """Method for writing combined movies to file
 
         Parameters
@@ -213,24 +503,98 @@ class Dashboard():
 
                        https://www.fourcc.org/
 
+        segments : int (default=1)
+            If greater than 1, the movie is exported in parallel
+            segments. See write_movie_segments().
         """
+        if segments > 1:
+            return self.write_movie_segments(filename, fourcc=fourcc,
+                                             segments=segments)
         cv2.startWindowThread()
         print("Creating and exporting movie to file...")
-        writer = cv2.VideoWriter(filename, 0,
-                                 fourcc=cv2.VideoWriter_fourcc(*fourcc),
-                                 fps=30, frameSize=self.window_size)
+        writer = open_writer(filename, fourcc, self.window_size)
         self.reset_movies()
         movie_key = None
-        if writer.isOpened():
-            while(np.all([movie.isOpened() for movie in self.movie_list])):
-                statuses = self.read_frames()
-                if np.any(statuses):
-                    self.display_frames(writer=writer)
-                else:
-                    self.release_movies()
-                    cv2.destroyAllWindows()
-                    cv2.waitKey(1)
-                    break
-            writer.release()
-        else:
-            raise RuntimeError("VideoWriter could not be opened.")
+        while(np.all([movie.isOpened() for movie in self.movie_list])):
+            statuses = self.read_frames()
+            if np.any(statuses):
+                self.display_frames(writer=writer)
+            else:
+                self.release_movies()
+                cv2.destroyAllWindows()
+                cv2.waitKey(1)
+                break
+        writer.release()
+
+
+    def write_movie_segments(self, filename, fourcc='MJPG', segments=None):
+        """Method for writing combined movies to file, where the timeline
+        is split into segments that are each decoded, composited and
+        encoded by a separate worker process. The segment files are then
+        concatenated without re-encoding using ffmpeg, which must be
+        available on the PATH.
+
+        Only MJPG output is supported, as segments are encoded by
+        OpenCV's fixed-quality MJPEG encoder and can be joined without
+        re-encoding. The input movies must seek exactly (eg, intra-frame
+        codecs such as MJPG, or movies loaded through a FrameCache) for
+        segment boundaries to match write_movie(); see
+        scripts/segment_export_check.py for a frame-by-frame comparison.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to which the movie will be written.
+        fourcc : str (default='MJPG')
+            FOURCC video format code. Must be 'MJPG'.
+        segments : int (default=None)
+            Number of segments/worker processes. If None, the number
+            of available CPUs is used.
+        """
+        if fourcc != 'MJPG':
+            raise ValueError("Segmented export only supports the 'MJPG' "
+                             "FOURCC code.")
+        if shutil.which('ffmpeg') is None:
+            raise RuntimeError("ffmpeg is required to concatenate "
+                               "exported segments.")
+        if segments is None:
+            segments = os.cpu_count()
+        total_frames = int(max(self.num_frames)) - 1
+        segments = max(1, min(segments, total_frames))
+        bounds = np.linspace(0, total_frames, segments + 1).astype(int)
+
+        print("Creating and exporting movie to file in {} segments..."
+              .format(segments))
+        dashboard_options = {'movie_files' : self.movie_files,
+                             'labels' : self.labels,
+                             'cache' : self.cache,
+                             'panels' : self.panels}
+        segment_dir = tempfile.mkdtemp(dir=os.path.dirname(
+                                       os.path.abspath(filename)))
+        ext = os.path.splitext(filename)[1]
+        segment_files = [os.path.join(segment_dir, 'segment_{:0>4}{}'
+                         .format(i, ext)) for i in range(segments)]
+        jobs = [(dashboard_options, i, bounds[i], bounds[i+1],
+                 segment_files[i], fourcc) for i in range(segments)]
+
+        begin = time.perf_counter()
+        try:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(segments, mp_context=context) as pool:
+                futures = [pool.submit(export_segment, *job) for job in jobs]
+                for future in futures:
+                    future.result()
+
+            concat_list = os.path.join(segment_dir, 'segments.txt')
+            with open(concat_list, 'w') as cfile:
+                for segment_file in segment_files:
+                    cfile.write("file '{}'\n".format(segment_file))
+            subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat',
+                            '-safe', '0', '-i', concat_list, '-c', 'copy',
+                            filename], check=True)
+        finally:
+            shutil.rmtree(segment_dir)
+
+        elapsed = time.perf_counter() - begin
+        print("{} frames exported in {:.1f} s ({:.1f} frames/s)"
+              .format(total_frames, elapsed, total_frames / elapsed))
@@ -0,0 +1,101 @@
+import os
+import tempfile
+
+
+class DiskCache():
+    """Base class for a directory of cached files with a total size cap.
+    Files sharing the same stem (the part of the name before the first
+    '.') form a single entry, and entries are evicted least recently
+    used first. Hidden files (starting with '.') are in-progress writes
+    and are never counted or evicted.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the cached files. It is created if it does
+        not exist.
+    max_size : float (default=4096)
+        Maximum total size of the directory in megabytes.
+    """
+
+    def __init__(self, cache_dir, max_size=4096):
+        self.cache_dir = cache_dir
+        self.max_size = max_size * 1024**2
+        os.makedirs(cache_dir, exist_ok=True)
+        self.size = sum(entry[1] for entry in self.entries())
+
+    def entries(self):
+        """Method that lists cache entries
+
+        Returns
+        -------
+        entries : list of tuples
+            (stem, size in bytes, filenames) for each entry, ordered from
+            least to most recently used.
+        """
+        stems = {}
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('.'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            stem = name.split('.', 1)[0]
+            used, size, names = stems.get(stem, (0, 0, []))
+            stems[stem] = (max(used, stat.st_mtime), size + stat.st_size,
+                           names + [name])
+        order = sorted(stems.items(), key=lambda item: item[1][0])
+        return [(stem, size, names) for stem, (_, size, names) in order]
+
+    def touch(self, path):
+        """Method that marks the entry containing path as recently used"""
+        os.utime(path)
+
+    def temp_path(self):
+        """Method that returns a new hidden file in the cache directory,
+        to be renamed into place once it is completely written.
+        """
+        handle, path = tempfile.mkstemp(prefix='.', dir=self.cache_dir)
+        os.close(handle)
+        return path
+
+    def reserve(self, size):
+        """Method that makes room for size additional bytes, evicting
+        entries if needed, and adds them to the tracked cache size.
+
+        Parameters
+        ----------
+        size : int
+            Number of bytes about to be added to the cache.
+
+        Returns
+        -------
+        fits : Boolean
+            False if size exceeds max_size, in which case nothing is
+            reserved.
+        """
+        if size > self.max_size:
+            return False
+        if self.size + size > self.max_size:
+            # free an extra tenth of the cache to avoid evicting on
+            # every subsequent addition
+            self.evict(required=size + self.max_size // 10)
+        self.size += size
+        return True
+
+    def evict(self, required=0):
+        """Method that removes least recently used entries until the
+        cache, plus required additional bytes, fits within max_size.
+
+        Parameters
+        ----------
+        required : int (default=0)
+            Number of bytes that must be freed in addition to bringing
+            the cache within its size limit.
+        """
+        entries = self.entries()
+        self.size = sum(entry[1] for entry in entries)
+        for _, size, names in entries:
+            if self.size + required <= self.max_size:
+                break
+            for name in names:
+                os.remove(os.path.join(self.cache_dir, name))
+            self.size -= size
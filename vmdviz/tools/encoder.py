@@ -0,0 +1,157 @@
+import cv2
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+# Renderers that write finished images directly, rather than scene
+# files that must be rendered by an external program
+IMAGE_RENDERERS = ['snapshot', 'TachyonInternal']
+
+
+def scratch_dir():
+    """Helper function to create a temporary directory for individually
+    rendered images, placed on tmpfs (/dev/shm) when available so that
+    images never touch shared storage.
+
+    Returns
+    -------
+    dirname : str
+        Path of the new temporary directory.
+    """
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return tempfile.mkdtemp(prefix='vmdviz_', dir='/dev/shm')
+    return tempfile.mkdtemp(prefix='vmdviz_')
+
+
+class MovieEncoder():
+    """Class for encoding rendered images straight into a movie file,
+    so that individually rendered images do not need to be kept on disk
+    and read back by a separate tool. Frames are encoded either with
+    an OpenCV VideoWriter or by an ffmpeg subprocess fed raw frames over
+    a pipe. The encoder is opened when the first frame is written, using
+    its size.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file to which the movie will be written.
+    fps : float (default=30)
+        Frame rate of the movie.
+    backend : str (default='opencv')
+        Either 'opencv' or 'ffmpeg'. The 'ffmpeg' backend requires
+        ffmpeg to be available on the PATH.
+    fourcc : str (default='MJPG')
+        FOURCC video format code used by the 'opencv' backend.
+    ffmpeg_options : list of str (default=None)
+        Output options passed to ffmpeg by the 'ffmpeg' backend. If
+        None, frames are padded to even dimensions (required by
+        yuv420p) and encoded with libx264 in yuv420p.
+    """
+
+    def __init__(self, filename, fps=30, backend='opencv', fourcc='MJPG',
+                 ffmpeg_options=None):
+        if backend not in ['opencv', 'ffmpeg']:
+            raise ValueError("backend must be either 'opencv' or 'ffmpeg'.")
+        if backend == 'ffmpeg' and shutil.which('ffmpeg') is None:
+            raise RuntimeError("ffmpeg is required for the 'ffmpeg' backend.")
+        if ffmpeg_options is None:
+            ffmpeg_options = ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                              '-c:v', 'libx264', '-pix_fmt', 'yuv420p']
+        self.filename = filename
+        self.fps = fps
+        self.backend = backend
+        self.fourcc = fourcc
+        self.ffmpeg_options = ffmpeg_options
+        self.frame_size = None
+        self.writer = None
+        self.process = None
+        self.num_frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self, frame_size):
+        """Method that starts the encoder
+
+        Parameters
+        ----------
+        frame_size : tuple of int
+            (width, height) of the movie frames.
+        """
+        self.frame_size = frame_size
+        if self.backend == 'opencv':
+            self.writer = cv2.VideoWriter(self.filename, 0,
+                                          fourcc=cv2.VideoWriter_fourcc(*self.fourcc),
+                                          fps=self.fps, frameSize=frame_size)
+            if not self.writer.isOpened():
+                raise RuntimeError("VideoWriter could not be opened.")
+        else:
+            command = (['ffmpeg', '-y', '-loglevel', 'error',
+                        '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                        '-s', '{}x{}'.format(*frame_size),
+                        '-r', str(self.fps), '-i', '-'] +
+                       self.ffmpeg_options + [self.filename])
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        """Method for encoding a single frame
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            BGR image of shape (height, width, 3).
+        """
+        frame_size = (frame.shape[1], frame.shape[0])
+        if self.frame_size is None:
+            self.open(frame_size)
+        elif frame_size != self.frame_size:
+            raise RuntimeError("Frame size {} does not match the movie "
+                               "frame size {}.".format(frame_size,
+                                                       self.frame_size))
+        if self.writer is not None:
+            self.writer.write(frame)
+        else:
+            self.process.stdin.write(frame.tobytes())
+        self.num_frames += 1
+
+    def write_file(self, image_file, remove=True):
+        """Method for encoding a rendered image file, which is read once
+        into memory and deleted after it has been encoded.
+
+        Parameters
+        ----------
+        image_file : str
+            Rendered image, in a format readable by OpenCV (eg, BMP,
+            PPM or PNG).
+        remove : Boolean (default=True)
+            If True, image_file is deleted once it has been encoded.
+            It is kept if encoding fails.
+        """
+        frame = cv2.imread(image_file)
+        if frame is None:
+            raise RuntimeError("Rendered image '{}' could not be read. "
+                               "Use an image format readable by OpenCV."
+                               .format(image_file))
+        self.write(frame)
+        if remove:
+            os.remove(image_file)
+
+    def close(self):
+        """Method that finalizes the movie file"""
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+        if self.process is not None:
+            self.process.stdin.close()
+            if self.process.wait() != 0:
+                raise RuntimeError("ffmpeg exited with code {}."
+                                   .format(self.process.returncode))
+            self.process = None
+        if self.num_frames:
+            print("{} frames encoded to '{}'.".format(self.num_frames,
+                                                      self.filename))
@@ -0,0 +1,184 @@
+import numpy as np
+import cv2
+import hashlib
+import json
+import os
+from .diskcache import DiskCache
+from .sources import MovieSource, ScaledCapture, resize_frame, scaled_size
+
+
+class CachedMovie(MovieSource):
+    """Dashboard movie source reading decoded frames from a memory-mapped
+    raw file written by FrameCache.
+
+    Parameters
+    ----------
+    raw_file : str
+        Raw file containing the decoded frames as contiguous uint8
+        arrays of shape (height, width, 3).
+    meta : dict
+        Cache metadata with 'num_frames', 'height', 'width' and 'fps'
+        keys.
+    """
+
+    def __init__(self, raw_file, meta):
+        super().__init__()
+        self.meta = meta
+        self.frames = np.memmap(raw_file, dtype=np.uint8, mode='r',
+                                shape=(meta['num_frames'], meta['height'],
+                                       meta['width'], 3))
+
+    def frame_count(self):
+        return self.meta['num_frames']
+
+    def read_frame(self, index):
+        # copied, as Dashboard draws labels directly onto the frames
+        return np.array(self.frames[index])
+
+    def properties(self):
+        return {cv2.CAP_PROP_FRAME_HEIGHT : self.meta['height'],
+                cv2.CAP_PROP_FRAME_WIDTH : self.meta['width'],
+                cv2.CAP_PROP_FPS : self.meta['fps']}
+
+    def release(self):
+        super().release()
+        self.frames = None
+
+
+class FrameCache(DiskCache):
+    """Class for caching decoded movie frames in memory-mapped raw files,
+    so that repeated Dashboard sessions, seeks and exports can read frames
+    without any codec work. Cache entries are keyed by the absolute path
+    and modification time of the movie, as well as the downscaling
+    factor, and are evicted least recently used first once the cache
+    exceeds max_size.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory in which the cached frames are stored. It is created
+        if it does not exist.
+    max_size : float (default=4096)
+        Maximum total size of the cache directory in megabytes.
+    scale : float (default=1.0)
+        Factor by which frames are downscaled before caching.
+    """
+
+    def __init__(self, cache_dir, max_size=4096, scale=1.0):
+        if scale <= 0 or scale > 1:
+            raise ValueError("scale must be within (0, 1].")
+        super().__init__(cache_dir, max_size=max_size)
+        self.scale = scale
+
+    def key(self, movie_file):
+        """Method for computing the cache key of a movie file
+
+        Parameters
+        ----------
+        movie_file : str
+            Movie file for which the key is computed.
+
+        Returns
+        -------
+        key : str
+            Hex digest identifying the movie path, mtime and scale.
+        """
+        path = os.path.abspath(movie_file)
+        identity = "{}:{}:{}".format(path, os.path.getmtime(path), self.scale)
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def load(self, movie_file):
+        """Method for loading a movie through the cache. On a cache
+        miss, the movie is decoded once and its frames are written to
+        the cache. If the decoded frames cannot fit in the cache, the
+        movie is read through a ScaledCapture instead, so that its
+        frames still match the size of the cached movies.
+
+        Parameters
+        ----------
+        movie_file : str
+            Filename from which a movie is loaded.
+
+        Returns
+        -------
+        movie : CachedMovie or ScaledCapture
+            Movie whose frames are read from the cache if possible.
+        """
+        key = self.key(movie_file)
+        raw_file = os.path.join(self.cache_dir, key + '.raw')
+        meta_file = os.path.join(self.cache_dir, key + '.json')
+        if os.path.exists(meta_file) and os.path.exists(raw_file):
+            with open(meta_file) as jfile:
+                meta = json.load(jfile)
+            self.touch(raw_file)
+        else:
+            meta = self.populate(movie_file, raw_file, meta_file)
+            if meta is None:
+                return ScaledCapture(movie_file, scale=self.scale)
+        return CachedMovie(raw_file, meta)
+
+    def populate(self, movie_file, raw_file, meta_file):
+        """Method that decodes a movie and writes its frames to the
+        cache.
+
+        Parameters
+        ----------
+        movie_file : str
+            Movie file that is decoded.
+        raw_file : str
+            Raw file to which decoded frames are written.
+        meta_file : str
+            JSON file to which the cache metadata is written.
+
+        Returns
+        -------
+        meta : dict or None
+            Cache metadata, or None if the movie could not be cached.
+        """
+        movie = cv2.VideoCapture(movie_file)
+        size = scaled_size(movie.get(cv2.CAP_PROP_FRAME_WIDTH),
+                           movie.get(cv2.CAP_PROP_FRAME_HEIGHT), self.scale)
+        estimate = int(movie.get(cv2.CAP_PROP_FRAME_COUNT)) * size[0] * size[1] * 3
+        if not self.reserve(estimate):
+            movie.release()
+            return None
+
+        print("Caching decoded frames of '{}'...".format(movie_file))
+        num_frames = 0
+        written = 0
+        fits = True
+        frame_bytes = size[0] * size[1] * 3
+        tmp_file = self.temp_path()
+        with open(tmp_file, 'wb') as rfile:
+            while True:
+                status, frame = movie.read()
+                if not status:
+                    break
+                if written + frame_bytes > self.max_size:
+                    # the frame count was underreported, and the movie
+                    # does not fit in the cache at all
+                    fits = False
+                    break
+                frame = resize_frame(frame, size)
+                rfile.write(np.ascontiguousarray(frame).tobytes())
+                written += frame_bytes
+                num_frames += 1
+        meta = {'movie_file' : os.path.abspath(movie_file),
+                'num_frames' : num_frames,
+                'height' : size[1],
+                'width' : size[0],
+                'fps' : movie.get(cv2.CAP_PROP_FPS)}
+        movie.release()
+        self.size += written - estimate
+        if not fits or num_frames == 0:
+            os.remove(tmp_file)
+            self.size -= written
+            return None
+
+        os.replace(tmp_file, raw_file)
+        with open(meta_file, 'w') as jfile:
+            json.dump(meta, jfile)
+        if self.size > self.max_size:
+            # the estimate from the reported frame count was too small
+            self.evict()
+        return meta
@@ -0,0 +1,136 @@
+import cv2
+import glob
+import os
+import time
+from .sources import MovieSource, resize_frame
+
+
+def manifest_path(save_dir, filename):
+    """Helper function that returns the manifest file to which a render
+    job publishes its finished frames.
+
+    Parameters
+    ----------
+    save_dir : str
+        The directory in which rendered files are saved.
+    filename : str
+        The basename of the rendered files.
+
+    Returns
+    -------
+    manifest : str
+        Path of the manifest file.
+    """
+    return os.path.join(save_dir, filename + '.frames')
+
+
+def publish_frame(save_dir, filename, frame_file):
+    """Helper function to publish a finished frame by appending its path
+    to the manifest of the render job. Each path is written as a single
+    line, so that readers never see partially rendered frames.
+
+    Parameters
+    ----------
+    save_dir : str
+        The directory in which rendered files are saved.
+    filename : str
+        The basename of the rendered files.
+    frame_file : str
+        Path of the finished frame.
+    """
+    with open(manifest_path(save_dir, filename), 'a') as mfile:
+        mfile.write(os.path.abspath(frame_file) + '\n')
+
+
+class LiveMovie(MovieSource):
+    """Class for viewing frames of a running render job as a Dashboard
+    source, whose frame count grows as the render progresses. Finished
+    frames are read from the manifest published by
+    generate_trajectory_movie() or generate_rotation_movie(). If there is
+    no manifest, save_dir is watched for rendered files instead, and the
+    most recent file is only read once it has not been modified for poll
+    seconds.
+
+    Rendered images must be in a format readable by OpenCV (eg, BMP,
+    PPM or PNG).
+
+    Parameters
+    ----------
+    save_dir : str
+        The directory in which the render job saves files.
+    filename : str
+        The basename of the rendered files, which is also the name of
+        the manifest without its '.frames' extension.
+    render_ext : str (default='bmp')
+        filename extension of the rendered files, used when watching
+        save_dir.
+    size : tuple of int (default=None)
+        (width, height) to which frames are resized, so that they can
+        be tiled against reference movies. If None, frames are not
+        resized.
+    poll : float (default=1.0)
+        Interval in seconds at which the job is polled while waiting
+        for its first frame.
+    """
+
+    def __init__(self, save_dir, filename, render_ext='bmp', size=None,
+                 poll=1.0):
+        super().__init__()
+        self.save_dir = save_dir
+        self.filename = filename
+        self.render_ext = render_ext
+        self.size = size
+        self.poll = poll
+        self.manifest = manifest_path(save_dir, filename)
+        self.manifest_offset = 0
+        self.frame_files = []
+
+        self.refresh()
+        if not self.frame_files:
+            print("Waiting for frames of '{}'...".format(filename))
+        while not self.frame_files:
+            time.sleep(poll)
+            self.refresh()
+
+    def refresh(self):
+        """Method that collects frames finished since the last call"""
+        if os.path.exists(self.manifest):
+            if os.path.getsize(self.manifest) < self.manifest_offset:
+                # the render job was restarted with a fresh manifest
+                self.manifest_offset = 0
+                self.frame_files = []
+            with open(self.manifest, 'rb') as mfile:
+                mfile.seek(self.manifest_offset)
+                lines = mfile.read()
+            # only consume complete lines
+            end = lines.rfind(b'\n') + 1
+            self.manifest_offset += end
+            self.frame_files.extend(lines[:end].decode().splitlines())
+        else:
+            pattern = os.path.join(self.save_dir, self.filename +
+                                   '*.' + self.render_ext)
+            frame_files = sorted(glob.glob(pattern))
+            # the newest file may still be written by the renderer
+            if (frame_files and time.time() -
+                    os.path.getmtime(frame_files[-1]) < self.poll):
+                frame_files = frame_files[:-1]
+            self.frame_files = frame_files
+
+    def frame_count(self):
+        if self.position >= len(self.frame_files):
+            self.refresh()
+        return len(self.frame_files)
+
+    def get(self, prop):
+        """Method for querying movie properties. The frame count is
+        refreshed on every query.
+        """
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            self.refresh()
+        return super().get(prop)
+
+    def read_frame(self, index):
+        frame = cv2.imread(self.frame_files[index])
+        if frame is not None and self.size is not None:
+            frame = resize_frame(frame, self.size)
+        return frame
@@ -9,10 +9,57 @@ from vmd import atomsel
 from vmd import trans
 from vmd import graphics
 from vmd import evaltcl
+from vmd import vmdnumpy
 from collections.abc import Iterable
+from contextlib import contextmanager
+import hashlib
 import os
 import numpy as np
+import shutil
 import subprocess
+from .live import manifest_path, publish_frame
+from .encoder import IMAGE_RENDERERS, scratch_dir
+
+
+# Renderers that capture the OpenGL framebuffer, and therefore require
+# the display to be redrawn before each image is rendered
+OPENGL_RENDERERS = ['snapshot']
+
+# Display attributes that affect the content of rendered images
+HASHED_DISPLAY_ATTRIBUTES = ['eyesep', 'focallength', 'height', 'distance',
+                             'nearclip', 'farclip', 'antialias', 'depthcue',
+                             'culling', 'stereo', 'projection', 'size',
+                             'ambientocclusion', 'aoambient', 'aodirect',
+                             'shadows', 'dof', 'dof_fnumber', 'dof_focaldist']
+
+# Tcl script collecting scene settings that affect rendered images but
+# are not exposed through the Python API: light states and positions,
+# material definitions, color definitions, category color assignments,
+# the color scale and the renderer options. Each query is guarded, as
+# not every renderer has options and not every VMD build supports all
+# color scale queries.
+SCENE_STATE_TCL = """
+set state {{}}
+for {{set i 0}} {{$i < [light num]}} {{incr i}} {{
+    lappend state [light $i status] [light $i pos]
+}}
+foreach name [material list] {{
+    lappend state $name [material settings $name]
+}}
+for {{set i 0}} {{$i < [colorinfo num]}} {{incr i}} {{
+    lappend state [colorinfo rgb $i]
+}}
+foreach category [colorinfo categories] {{
+    foreach item [colorinfo category $category] {{
+        lappend state [colorinfo category $category $item]
+    }}
+}}
+foreach query {{method midpoint min max}} {{
+    if {{![catch {{color scale $query}} value]}} {{ lappend state $value }}
+}}
+if {{![catch {{render options {renderer}}} value]}} {{ lappend state $value }}
+set state
+"""
 
 
 def dir_check(dirname):
@@ -51,6 +98,205 @@ def dir_check(dirname):
         return True
 
 
+def update_display(renderer=None, headless=False):
+    """Helper function to redraw the VMD display. In headless mode, the
+    redraw is skipped unless the chosen renderer captures the OpenGL
+    framebuffer. External renderers (eg, Tachyon, POV3) regenerate the
+    scene geometry themselves when render.render is called.
+
+    Parameters
+    ----------
+    renderer : str (default=None)
+        Renderer that will be called after the update.
+    headless : Boolean (default=False)
+        If True, interactive redraws are suppressed.
+    """
+
+    if not headless or renderer in OPENGL_RENDERERS:
+        display.update()
+
+
+@contextmanager
+def display_updates_off(headless=False):
+    """Context manager that batches display state changes in headless
+    mode by switching off automatic display updates, so that frame,
+    rotation and representation changes do not each trigger a redraw.
+    The previous update state is restored on exit, so a prior
+    'display update off' is respected.
+
+    Parameters
+    ----------
+    headless : Boolean (default=False)
+        If False, automatic display updates are left untouched.
+    """
+
+    if not headless:
+        yield
+        return
+    was_on = evaltcl("display update status").strip() in ['on', '1']
+    display.update_off()
+    try:
+        yield
+    finally:
+        if was_on:
+            display.update_on()
+
+
+def render_config_hash(molecule, renderer, render_ext):
+    """Helper function to hash the parts of the scene that are constant
+    over a movie: molecule representations and bonds, display settings,
+    axes, lights, materials, colors and the renderer configuration.
+
+    Parameters
+    ----------
+    molecule : VMDMolecule
+        Molecule that is rendered.
+    renderer : str
+        Renderer used for each frame.
+    render_ext : str
+        filename extension for indivudally rendered files.
+
+    Returns
+    -------
+    config : dict
+        Dictionary with the 'digest' of the configuration, the
+        'indices' of atoms covered by at least one representation, and
+        the smoothing 'window' applied to the representations.
+    """
+
+    config = hashlib.blake2b()
+    config.update("{}:{}".format(renderer, render_ext).encode())
+    selections = []
+    window = 0
+    for i in range(molrep.num(molecule.molid)):
+        selection = molrep.get_selection(molecule.molid, i)
+        selections.append("({})".format(selection))
+        window = max(window, molrep.get_smoothing(molecule.molid, i))
+        config.update(str([molrep.get_style(molecule.molid, i),
+                           molrep.get_color(molecule.molid, i),
+                           molrep.get_material(molecule.molid, i),
+                           selection,
+                           molrep.get_visible(molecule.molid, i),
+                           molrep.get_smoothing(molecule.molid, i)]).encode())
+    for attribute in HASHED_DISPLAY_ATTRIBUTES:
+        config.update(str(display.get(attribute)).encode())
+    config.update(str(axes.get_location()).encode())
+    config.update(str(evaltcl(SCENE_STATE_TCL.format(renderer=renderer)))
+                  .encode())
+
+    rendered_atoms = atomsel(" or ".join(selections) or "none",
+                             molid=molecule.molid)
+    config.update(str(rendered_atoms.bonds).encode())
+    return {'digest' : config.digest(),
+            'indices' : np.array(rendered_atoms.index, dtype=int),
+            'window' : window}
+
+
+def frame_hash(molecule, frame, config):
+    """Helper function to compute the content hash of a rendered frame
+    from the coordinates of the rendered atoms, the current view
+    matrices and the constant scene configuration. When smoothing is
+    applied, the coordinates of all frames within the smoothing window
+    are hashed.
+
+    Parameters
+    ----------
+    molecule : VMDMolecule
+        Molecule that is rendered.
+    frame : int
+        Trajectory frame that is rendered.
+    config : dict
+        Output of render_config_hash() for the current movie.
+
+    Returns
+    -------
+    key : str
+        Hex digest identifying the content of the frame.
+    """
+
+    content = hashlib.blake2b(config['digest'])
+    num_frames = mol.numframes(molecule.molid)
+    first = max(0, frame - config['window'])
+    last = min(num_frames - 1, frame + config['window'])
+    for i in range(first, last + 1):
+        coords = vmdnumpy.timestep(molecule.molid, i)[config['indices']]
+        content.update(np.ascontiguousarray(coords).tobytes())
+    for matrix in [trans.get_rotation(molecule.molid),
+                   trans.get_center(molecule.molid),
+                   trans.get_scale(molecule.molid),
+                   trans.get_translation(molecule.molid)]:
+        content.update(np.asarray(matrix, dtype=np.float64).tobytes())
+    return content.hexdigest()
+
+
+def render_frame(molecule, frame, renderer, filename, store=None,
+                 config=None):
+    """Helper function to render a single image, reusing a previously
+    rendered identical image from a RenderStore if one exists.
+
+    Parameters
+    ----------
+    molecule : VMDMolecule
+        Molecule that is rendered.
+    frame : int
+        Trajectory frame that is rendered.
+    renderer : str
+        Renderer used for the image.
+    filename : str
+        Filename of the rendered image.
+    store : RenderStore (default=None)
+        If not None, the content-addressed store that is checked
+        before rendering, and to which new images are added.
+    config : dict (default=None)
+        Output of render_config_hash(). Required if store is not None.
+    """
+
+    if store is None:
+        render.render(renderer, filename)
+        return
+    key = frame_hash(molecule, frame, config)
+    if not store.fetch(key, filename):
+        render.render(renderer, filename)
+        store.put(key, filename)
+
+
+def render_dir_for(save_dir, renderer, encoder=None, publish=False):
+    """Helper function that returns the directory in which individual
+    images are rendered. When encoding directly to a movie, images are
+    rendered to a scratch directory (on tmpfs when available) instead of
+    save_dir.
+
+    Parameters
+    ----------
+    save_dir : str
+        The directory in which generated files will be saved.
+    renderer : str
+        Renderer used for each image.
+    encoder : MovieEncoder (default=None)
+        Encoder to which rendered images are fed.
+    publish : Boolean (default=False)
+        Whether finished images are published for live preview.
+
+    Returns
+    -------
+    render_dir : str
+        Directory for individually rendered images.
+    """
+
+    if publish and renderer not in IMAGE_RENDERERS:
+        raise ValueError("Frames can only be published by a renderer that "
+                         "writes images, one of: {}".format(IMAGE_RENDERERS))
+    if encoder is None:
+        return save_dir
+    if renderer not in IMAGE_RENDERERS:
+        raise ValueError("Direct encoding requires a renderer that writes "
+                         "images, one of: {}".format(IMAGE_RENDERERS))
+    if publish:
+        raise ValueError("Frames cannot be published when they are encoded "
+                         "directly, as individual images are not kept.")
+    return scratch_dir()
+
+
 def generate_bonds(molid, indices):
     """Generates bonds between backbone atoms of adjacent
     amino acids in teh molecule
@@ -72,7 +318,9 @@ def generate_bonds(molid, indices):
 
 def generate_rotation_movie(molecule, filename, save_dir='.', frame=0,
                             angle=360, division=1.0,
-                            renderer='Tachyon', render_ext='dat'):
+                            renderer='Tachyon', render_ext='dat',
+                            headless=False, store=None, publish=False,
+                            encoder=None):
     """Function for generating movies where a static molecule frame is
     rotated through an angle. Individual files for each subrotation
     are generated, which can then be processed and combined into a
@@ -100,6 +348,26 @@ def generate_rotation_movie(molecule, filename, save_dir='.', frame=0,
             https://www.ks.uiuc.edu/Research/vmd/vmd-1.7.1/ug/node89.html
     render_ext : str (default='dat')
         filename extension for indivudally rendered files.
+    headless : Boolean (default=False)
+        If True, automatic and per-frame display redraws are suppressed
+        for renderers that do not capture the OpenGL framebuffer. This
+        is useful on offscreen/headless nodes, where only the output of
+        the renderer is needed.
+    store : RenderStore (default=None)
+        If not None, each image is looked up in this content-addressed
+        store by a hash of the rendered coordinates, view, styles and
+        renderer configuration, and only rendered if it is not found.
+    publish : Boolean (default=False)
+        If True, the path of each finished image is appended to a
+        manifest in save_dir, so that the render can be previewed while
+        it progresses with a LiveMovie source in a Dashboard.
+    encoder : MovieEncoder (default=None)
+        If not None, each image is rendered to a scratch directory, read
+        once into memory, deleted, and fed to this encoder, so that only
+        the final movie is written to disk. Requires a renderer that
+        writes images directly (see IMAGE_RENDERERS) and an image format
+        readable by OpenCV. The encoder is not closed, so that several
+        movies can be encoded into the same file.
     """
 
     check = dir_check(save_dir)
@@ -112,21 +380,44 @@ def generate_rotation_movie(molecule, filename, save_dir='.', frame=0,
     else:
         if frame == -1:
             frame = mol.numframes(molecule.molid)  - 1
-        mol.set_frame(molecule.molid, frame)
-        display.update()
-        sub_rotations = int(angle / division)
-        current_angle = 0.0
-        for i in range(0,sub_rotations):
-            render.render(renderer, save_dir + '/' + filename +
-                          '{:0>9}.{}'.format(int(i), render_ext))
-            trans.rotate_scene('y', division)
-            display.update()
-            current_angle += division
+        render_dir = render_dir_for(save_dir, renderer, encoder, publish)
+        try:
+            with display_updates_off(headless):
+                mol.set_frame(molecule.molid, frame)
+                if store is not None:
+                    config = render_config_hash(molecule, renderer, render_ext)
+                else:
+                    config = None
+                sub_rotations = int(angle / division)
+                current_angle = 0.0
+                if publish and os.path.exists(manifest_path(save_dir, filename)):
+                    os.remove(manifest_path(save_dir, filename))
+                for i in range(0,sub_rotations):
+                    # a single redraw per frame, after all state changes
+                    update_display(renderer, headless)
+                    frame_file = (render_dir + '/' + filename +
+                                  '{:0>9}.{}'.format(int(i), render_ext))
+                    render_frame(molecule, frame, renderer, frame_file,
+                                 store=store, config=config)
+                    if encoder is not None:
+                        encoder.write_file(frame_file)
+                    if publish:
+                        publish_frame(save_dir, filename, frame_file)
+                    trans.rotate_scene('y', division)
+                    current_angle += division
+            update_display(headless=headless)
+        finally:
+            if encoder is not None:
+                shutil.rmtree(render_dir)
+        if store is not None:
+            store.report()
 
 
 def generate_trajectory_movie(molecule, filename, save_dir='.', start=0, stop=-1,
                               step=1, smoothing=0,
-                              renderer='Tachyon', render_ext='dat'):
+                              renderer='Tachyon', render_ext='dat',
+                              headless=False, store=None, publish=False,
+                              encoder=None):
     """Function for generating movies of molecular trajectories
 
     Parameters
@@ -155,6 +446,20 @@ def generate_trajectory_movie(molecule, filename, save_dir='.', start=0, stop=-1
 
     render_ext : str (default='dat')
         filename extension for indivudally rendered files.
+    headless : Boolean (default=False)
+        If True, automatic and per-frame display redraws are suppressed
+        for renderers that do not capture the OpenGL framebuffer. See
+        generate_rotation_movie().
+    store : RenderStore (default=None)
+        If not None, content-addressed store used to skip rendering of
+        previously rendered identical frames. See
+        generate_rotation_movie().
+    publish : Boolean (default=False)
+        If True, finished frames are published for live preview. See
+        generate_rotation_movie().
+    encoder : MovieEncoder (default=None)
+        If not None, rendered images are fed to this encoder instead of
+        being kept in save_dir. See generate_rotation_movie().
     """
 
     # Perform checks
@@ -172,21 +477,40 @@ def generate_trajectory_movie(molecule, filename, save_dir='.', start=0, stop=-1
     if stop == -1:
         stop = num_loaded_frames - 1
 
-    if smoothing > 0:
-        reps = molrep.num(molecule.molid)
-        for i in range(reps):
-           molrep.set_smoothing(molecule.molid, i, smoothing)
-
     print("generating '{}' trajectory movie...".format(filename))
     frames = np.arange(start, stop, step)
-    mol.set_frame(molecule.molid, start)
-    current_frame = start
-    display.update()
-    for i in frames:
-        mol.set_frame(molecule.molid, i)
-        display.update()
-        render.render(renderer, save_dir + '/' + filename +
-                      '_{:0>9}.{}'.format(int(i), render_ext))
+    render_dir = render_dir_for(save_dir, renderer, encoder, publish)
+    try:
+        with display_updates_off(headless):
+            if smoothing > 0:
+                reps = molrep.num(molecule.molid)
+                for i in range(reps):
+                   molrep.set_smoothing(molecule.molid, i, smoothing)
+            mol.set_frame(molecule.molid, start)
+            current_frame = start
+            if store is not None:
+                config = render_config_hash(molecule, renderer, render_ext)
+            else:
+                config = None
+            if publish and os.path.exists(manifest_path(save_dir, filename)):
+                os.remove(manifest_path(save_dir, filename))
+            for i in frames:
+                mol.set_frame(molecule.molid, i)
+                # a single redraw per frame, after all state changes
+                update_display(renderer, headless)
+                frame_file = (render_dir + '/' + filename +
+                              '_{:0>9}.{}'.format(int(i), render_ext))
+                render_frame(molecule, i, renderer, frame_file,
+                             store=store, config=config)
+                if encoder is not None:
+                    encoder.write_file(frame_file)
+                if publish:
+                    publish_frame(save_dir, filename, frame_file)
+    finally:
+        if encoder is not None:
+            shutil.rmtree(render_dir)
+    if store is not None:
+        store.report()
 
 
 def init_display(display_options, axes_options):
@@ -267,14 +591,18 @@ class VMDMolecule():
     align : Boolean (default=True)
         If True, all frames of loaded trajectory data will be aligned
         to the configuration in the first trajectory frame.
+    headless : Boolean (default=False)
+        If True, display redraws are suppressed while loading and
+        aligning trajectory frames.
     """
 
     def __init__(self, pdb_file, load_data=None, style=None,
                  name='my_molecule', flush_pdb_frame=False,
-                 align=True, center=True):
+                 align=True, center=True, headless=False):
         self.molid = mol.new(name)
         mol.rename(self.molid, name)
         self.name = name
+        self.headless = headless
         mol.read(self.molid, 'pdb', pdb_file, beg=0, end=0, skip=1, waitfor=-1)
         self.all_atoms = atomsel("all")
 
@@ -321,9 +649,10 @@ class VMDMolecule():
         mol.set_frame(self.molid,0)
         base_selection = atomsel('all', frame=0)
         current_selection =  atomsel('all')
-        for i in range(mol.numframes(self.molid)):
-            mol.set_frame(self.molid, i)
-            current_selection.update()
-            trans_matrix = current_selection.fit(base_selection)
-            current_selection.move(trans_matrix)
-            display.update()
+        with display_updates_off(self.headless):
+            for i in range(mol.numframes(self.molid)):
+                mol.set_frame(self.molid, i)
+                current_selection.update()
+                trans_matrix = current_selection.fit(base_selection)
+                current_selection.move(trans_matrix)
+                update_display(headless=self.headless)
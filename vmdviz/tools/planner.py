@@ -0,0 +1,281 @@
+import os
+import struct
+
+
+# Residue names treated as solvent/ions when suggesting an atom
+# selection that drops solvent from the rendered representations
+SOLVENT_RESNAMES = ['HOH', 'WAT', 'SOL', 'TIP3', 'TIP4', 'TIP5', 'SPC',
+                    'T3P', 'T4P', 'NA', 'CL', 'K', 'MG', 'CA2', 'SOD',
+                    'CLA', 'POT']
+
+# VMD stores single precision x, y, z coordinates for every atom in
+# every loaded frame
+BYTES_PER_ATOM = 12
+
+
+def count_pdb_atoms(pdb_file):
+    """Helper function to count the atoms in the first model of a PDB
+    file without loading it into VMD.
+
+    Parameters
+    ----------
+    pdb_file : str
+        PDB file from which atoms are counted.
+
+    Returns
+    -------
+    num_atoms : int
+        Total number of ATOM/HETATM records in the first model.
+    num_solvent : int
+        Number of those atoms whose residue names are in
+        SOLVENT_RESNAMES.
+    """
+
+    num_atoms = 0
+    num_solvent = 0
+    with open(pdb_file) as pfile:
+        for line in pfile:
+            record = line[:6].strip()
+            if record in ['ATOM', 'HETATM']:
+                num_atoms += 1
+                if line[17:21].strip() in SOLVENT_RESNAMES:
+                    num_solvent += 1
+            elif record in ['ENDMDL', 'END']:
+                break
+    return num_atoms, num_solvent
+
+
+def read_xtc_header(traj_file):
+    """Helper function to read the atom and frame count of a Gromacs
+    XTC file by skipping over the compressed coordinate blocks of each
+    frame. No coordinates are decoded.
+
+    Parameters
+    ----------
+    traj_file : str
+        XTC file whose header information is read.
+
+    Returns
+    -------
+    header : dict
+        Dictionary with 'num_atoms', 'num_frames' and 'file_size' keys.
+    """
+
+    file_size = os.path.getsize(traj_file)
+    num_atoms = 0
+    num_frames = 0
+    with open(traj_file, 'rb') as tfile:
+        offset = 0
+        while offset < file_size:
+            tfile.seek(offset)
+            frame_header = tfile.read(56)
+            if len(frame_header) < 56:
+                break
+            magic, natoms = struct.unpack('>2i', frame_header[:8])
+            if magic != 1995:
+                raise ValueError("'{}' is not a valid XTC file "
+                                 "(bad magic number at byte {})."
+                                 .format(traj_file, offset))
+            num_atoms = natoms
+            if natoms <= 9:
+                # small systems are stored uncompressed: the 56 byte
+                # header (including the coordinate count) is followed
+                # directly by the coordinates as floats
+                offset += 56 + 3 * 4 * natoms
+            else:
+                tfile.seek(offset + 88)
+                num_bytes = struct.unpack('>i', tfile.read(4))[0]
+                offset += 92 + 4 * ((num_bytes + 3) // 4)
+            num_frames += 1
+    return {'num_atoms' : num_atoms, 'num_frames' : num_frames,
+            'file_size' : file_size}
+
+
+def read_dcd_header(traj_file):
+    """Helper function to read the atom and frame count of a CHARMM/NAMD
+    DCD file from its header records. The frame count is determined
+    from the file size, as many writers leave the header frame count
+    unset.
+
+    Parameters
+    ----------
+    traj_file : str
+        DCD file whose header information is read.
+
+    Returns
+    -------
+    header : dict
+        Dictionary with 'num_atoms', 'num_frames' and 'file_size' keys.
+    """
+
+    file_size = os.path.getsize(traj_file)
+    with open(traj_file, 'rb') as tfile:
+        marker = tfile.read(4)
+        if struct.unpack('<i', marker)[0] == 84:
+            endian = '<'
+        elif struct.unpack('>i', marker)[0] == 84:
+            endian = '>'
+        else:
+            raise ValueError("'{}' is not a valid DCD file.".format(traj_file))
+        control = tfile.read(84)
+        if control[:4] != b'CORD':
+            raise ValueError("'{}' is not a valid DCD file.".format(traj_file))
+        icntrl = struct.unpack(endian + '20i', control[4:])
+        has_unitcell = icntrl[10] == 1
+        tfile.read(4)
+        title_length = struct.unpack(endian + 'i', tfile.read(4))[0]
+        tfile.seek(title_length + 4, os.SEEK_CUR)
+        tfile.read(4)
+        num_atoms = struct.unpack(endian + 'i', tfile.read(4))[0]
+        tfile.read(4)
+        header_size = tfile.tell()
+
+    frame_size = 3 * (4 * num_atoms + 8)
+    if has_unitcell:
+        frame_size += 48 + 8
+    num_frames = (file_size - header_size) // frame_size
+    return {'num_atoms' : num_atoms, 'num_frames' : num_frames,
+            'file_size' : file_size}
+
+
+TRAJECTORY_READERS = {'xtc' : read_xtc_header,
+                      'dcd' : read_dcd_header}
+
+
+def read_trajectory_header(traj_file, filetype):
+    """Helper function to read atom and frame counts from a trajectory
+    file without loading its coordinates.
+
+    Parameters
+    ----------
+    traj_file : str
+        Trajectory file whose header information is read.
+    filetype : str
+        Trajectory type/file extension. Must be a key of
+        TRAJECTORY_READERS.
+
+    Returns
+    -------
+    header : dict
+        Dictionary with 'num_atoms', 'num_frames' and 'file_size' keys.
+    """
+
+    if filetype not in TRAJECTORY_READERS.keys():
+        raise ValueError("Cannot read header information for filetype "
+                         "'{}'. Supported filetypes are: {}"
+                         .format(filetype, list(TRAJECTORY_READERS.keys())))
+    return TRAJECTORY_READERS[filetype](traj_file)
+
+
+def plan_render(pdb_file, traj_file, filetype='xtc', mem_budget=2048,
+                target_frames=1000, max_stride=None, drop_solvent=True,
+                solvent_fraction=0.5, verbose=True):
+    """Function for choosing trajectory loading options that respect a
+    memory budget and a target movie length. Only the PDB records and
+    the trajectory headers are read, so the plan is available before
+    any coordinates are loaded into VMD.
+
+    The loaded frames are chosen as an evenly strided window over the
+    trajectory. By default the window spans the whole trajectory and the
+    stride is the smallest one that both fits within the memory budget
+    and yields at most target_frames frames. If max_stride is given and
+    this stride would exceed it, the stride is capped and the window is
+    shortened instead, preserving the temporal resolution of the movie.
+
+    Parameters
+    ----------
+    pdb_file : str
+        PDB file that provides the structure/topology.
+    traj_file : str
+        Trajectory file that will be loaded.
+    filetype : str (default='xtc')
+        Trajectory type/file extension.
+    mem_budget : float (default=2048)
+        Memory budget in megabytes for the loaded coordinate frames.
+    target_frames : int (default=1000)
+        Desired number of loaded frames, ie, the length of the
+        trajectory movie when rendered with a step of 1.
+    max_stride : int (default=None)
+        If not None, the largest stride that may be chosen.
+    drop_solvent : Boolean (default=True)
+        If True, an atom selection that excludes solvent/ions from the
+        molecule representations is suggested when more than
+        solvent_fraction of the atoms are solvent. The selection only
+        affects what is rendered; all atoms are still loaded and
+        counted in the planned memory.
+    solvent_fraction : float (default=0.5)
+        Fraction of solvent atoms above which the solvent is dropped.
+    verbose : Boolean (default=True)
+        If True, the chosen plan is printed.
+
+    Returns
+    -------
+    plan : dict
+        Dictionary with the chosen 'first', 'last', 'stride' and the
+        resulting 'num_frames' and 'memory' (in megabytes), the
+        suggested 'selection' (None if all atoms are kept) and a
+        'load_data' dictionary that can be passed directly to
+        VMDMolecule.load_data().
+    """
+
+    if target_frames < 1:
+        raise ValueError("target_frames must be a positive integer.")
+    if max_stride is not None and max_stride < 1:
+        raise ValueError("max_stride must be a positive integer.")
+
+    num_atoms, num_solvent = count_pdb_atoms(pdb_file)
+    header = read_trajectory_header(traj_file, filetype)
+    if header['num_atoms'] != num_atoms:
+        raise RuntimeError("PDB file '{}' has {} atoms, but trajectory '{}' "
+                           "has {} atoms.".format(pdb_file, num_atoms,
+                           traj_file, header['num_atoms']))
+    num_traj_frames = header['num_frames']
+    if num_traj_frames == 0:
+        raise RuntimeError("Trajectory '{}' has no frames.".format(traj_file))
+
+    frame_memory = num_atoms * BYTES_PER_ATOM / 1024**2
+    max_frames = int(mem_budget // frame_memory)
+    if max_frames < 1:
+        raise RuntimeError("A single frame ({:.1f} MB) does not fit within "
+                           "the memory budget of {} MB."
+                           .format(frame_memory, mem_budget))
+    num_frames = min(target_frames, max_frames, num_traj_frames)
+
+    # smallest stride yielding at most num_frames frames
+    stride = -(-num_traj_frames // num_frames)
+    last = num_traj_frames - 1
+    if max_stride is not None and stride > max_stride:
+        stride = max_stride
+        last = (num_frames - 1) * stride
+    num_frames = last // stride + 1
+
+    selection = None
+    if drop_solvent and num_solvent > solvent_fraction * num_atoms:
+        selection = "not resname {}".format(" ".join(SOLVENT_RESNAMES))
+
+    plan = {'first' : 0,
+            'last' : last,
+            'stride' : stride,
+            'num_frames' : num_frames,
+            'memory' : num_frames * frame_memory,
+            'selection' : selection,
+            'load_data' : {'filetype' : filetype,
+                           'filename' : traj_file,
+                           'first' : 0,
+                           'last' : last,
+                           'stride' : stride,
+                           'waitfor' : -1}}
+
+    if verbose:
+        print("Render plan for '{}' ({} atoms, {} trajectory frames):"
+              .format(traj_file, num_atoms, num_traj_frames))
+        print("    frame window : {} to {}".format(0, last))
+        print("    stride       : {}".format(stride))
+        print("    loaded frames: {}".format(num_frames))
+        print("    memory       : {:.1f} MB of {} MB budget"
+              .format(plan['memory'], mem_budget))
+        if selection:
+            print("    selection    : dropping {} solvent atoms from "
+                  "representations (loaded memory still includes them)"
+                  .format(num_solvent))
+    return plan
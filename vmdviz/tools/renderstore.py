@@ -0,0 +1,110 @@
+import os
+import shutil
+from .diskcache import DiskCache
+
+
+class RenderStore(DiskCache):
+    """Class for a content-addressed store of rendered frames. Rendered
+    files are stored under a hash of everything that determines their
+    content, so that identical frames (eg, rotation movies of replicas
+    sharing a starting structure, or repeated runs with an unchanged
+    view) are rendered only once. The store keeps its own copy of every
+    frame, and hits are copied to the requested location, so that files
+    in save_dir can be rewritten or post-processed without affecting
+    stored frames. When the total store size exceeds max_size, the least
+    recently used files are evicted.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory in which rendered frames are stored. It is created if
+        it does not exist.
+    max_size : float (default=4096)
+        Maximum total size of the store directory in megabytes.
+    """
+
+    def __init__(self, store_dir, max_size=4096):
+        super().__init__(store_dir, max_size=max_size)
+        self.store_dir = store_dir
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key, render_ext):
+        """Method that returns the store path of a rendered frame
+
+        Parameters
+        ----------
+        key : str
+            Content hash of the frame.
+        render_ext : str
+            Filename extension of the rendered file.
+
+        Returns
+        -------
+        path : str
+            Location of the frame within the store.
+        """
+        return os.path.join(self.store_dir, '{}.{}'.format(key, render_ext))
+
+    def fetch(self, key, dest):
+        """Method for retrieving a rendered frame from the store
+
+        Parameters
+        ----------
+        key : str
+            Content hash of the frame.
+        dest : str
+            Filename to which the stored frame is copied.
+
+        Returns
+        -------
+        hit : Boolean
+            True if the frame was found in the store. Any existing file
+            at dest is removed first, so that a file hardlinked into the
+            store by an earlier version is never written through.
+        """
+        if os.path.exists(dest):
+            os.remove(dest)
+        src = self.path(key, dest.rsplit('.', 1)[-1])
+        if not os.path.exists(src):
+            self.misses += 1
+            return False
+        self.touch(src)
+        shutil.copyfile(src, dest)
+        self.hits += 1
+        return True
+
+    def put(self, key, src):
+        """Method for adding a freshly rendered frame to the store. The
+        frame is copied to a hidden temporary file and renamed into
+        place, so that the store never holds partially written frames.
+
+        Parameters
+        ----------
+        key : str
+            Content hash of the frame.
+        src : str
+            Rendered file that is copied into the store.
+        """
+        dest = self.path(key, src.rsplit('.', 1)[-1])
+        size = os.path.getsize(src)
+        if os.path.exists(dest) or not self.reserve(size):
+            return
+        temp_file = self.temp_path()
+        try:
+            shutil.copyfile(src, temp_file)
+            os.replace(temp_file, dest)
+        except BaseException:
+            self.size -= size
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    def report(self):
+        """Method that prints the number of hits and misses, and the hit
+        rate, since the store was created.
+        """
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        print("render store: {} hits, {} misses ({:.1f}% hit rate)"
+              .format(self.hits, self.misses, rate))
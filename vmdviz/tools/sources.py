@@ -0,0 +1,136 @@
+import cv2
+
+
+def scaled_size(width, height, scale=1.0):
+    """Helper function for the size of a frame after downscaling. All
+    downscaled sources use this rounding, so that their frames can be
+    tiled together.
+
+    Parameters
+    ----------
+    width : int
+        Width of the original frame.
+    height : int
+        Height of the original frame.
+    scale : float (default=1.0)
+        Downscaling factor.
+
+    Returns
+    -------
+    size : tuple of int
+        (width, height) of the downscaled frame.
+    """
+    return (int(width * scale), int(height * scale))
+
+
+def resize_frame(frame, size):
+    """Helper function to resize a frame to (width, height), leaving it
+    untouched if it already has that size.
+    """
+    if (frame.shape[1], frame.shape[0]) == tuple(size):
+        return frame
+    return cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+
+
+class MovieSource():
+    """Base class for Dashboard movie sources that are not read through
+    cv2.VideoCapture. It provides the isOpened(), get(), set(), read()
+    and release() methods that Dashboard calls on captures; subclasses
+    only implement frame_count() and read_frame().
+    """
+
+    def __init__(self):
+        self.position = 0
+        self.opened = True
+
+    def frame_count(self):
+        """Returns the number of frames that can currently be read"""
+        raise NotImplementedError
+
+    def read_frame(self, index):
+        """Returns the frame at index, or None if it cannot be read"""
+        raise NotImplementedError
+
+    def properties(self):
+        """Returns a dictionary of additional cv2.CAP_PROP_* values"""
+        return {}
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        """Method for querying source properties by OpenCV capture
+        property identifier. Unsupported properties are 0.
+        """
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count())
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        return float(self.properties().get(prop, 0))
+
+    def set(self, prop, value):
+        """Method for seeking. Only cv2.CAP_PROP_POS_FRAMES is
+        supported, and False is returned for other properties.
+        """
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self.position = int(max(value, 0))
+        return True
+
+    def read(self):
+        """Method that reads the frame at the current position and
+        advances to the next one. Returns (False, None) past the last
+        readable frame.
+        """
+        if not self.opened or self.position >= self.frame_count():
+            return False, None
+        frame = self.read_frame(self.position)
+        if frame is None:
+            return False, None
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        self.opened = False
+
+
+class ScaledCapture():
+    """Wrapper around cv2.VideoCapture that downscales every frame it
+    reads, for movies that are too large to be held in a FrameCache
+    but must match the size of the cached movies next to them.
+
+    Parameters
+    ----------
+    movie_file : str
+        Filename from which a movie is loaded.
+    scale : float (default=1.0)
+        Downscaling factor.
+    """
+
+    def __init__(self, movie_file, scale=1.0):
+        self.capture = cv2.VideoCapture(movie_file)
+        self.size = scaled_size(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH),
+                                self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT),
+                                scale)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        return self.capture.get(prop)
+
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def read(self):
+        status, frame = self.capture.read()
+        if status:
+            frame = resize_frame(frame, self.size)
+        return status, frame
+
+    def release(self):
+        self.capture.release()